@@ -1,8 +1,22 @@
 import sqlite3
 import functools
+import inspect
 import logging
-from datetime import datetime
-from typing import Any, Callable, Optional
+import time
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+    import json
+
+def _dumps(record: dict) -> str:
+    """Serialize a structured log record to a compact JSON string."""
+    if orjson is not None:
+        return orjson.dumps(record).decode()
+    # Match orjson's raw UTF-8 output rather than \u escapes
+    return json.dumps(record, separators=(',', ':'), ensure_ascii=False)
 
 # Configure logging for database queries
 logging.basicConfig(
@@ -11,12 +25,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger('db_queries')
 
+@functools.lru_cache(maxsize=256)
+def _normalize(query: str) -> str:
+    """Collapse whitespace in a SQL string; repeated templates hit the cache."""
+    return ' '.join(query.split())
+
+def _log_error(function_name: str, error: Exception, query: Any) -> None:
+    """Log a failed query as a JSON 'error' record."""
+    # sqlite3.Error subclasses and unexpected errors share one record
+    # shape; error_type tells them apart
+    logger.error(_dumps({
+        'ts': time.time_ns(), 'event': 'error', 'func': function_name,
+        'error_type': type(error).__name__, 'error': str(error),
+        'sql': query if query is None or isinstance(query, str) else str(query),
+    }))
+
 def log_queries(func: Callable) -> Callable:
     """
     Decorator that logs SQL queries before execution.
     
     This decorator intercepts function calls that execute SQL queries,
-    logs the query with timestamp, and handles potential errors gracefully.
+    logs the query as a JSON record, and handles potential errors gracefully.
+    For functions returning a lazy iterator, 'completed' and 'error' cover
+    the call itself only; errors raised while the rows are consumed must
+    be logged by the iterator (see _stream_rows).
     
     Args:
         func: The function to be decorated (should accept 'query' parameter)
@@ -24,114 +56,143 @@ def log_queries(func: Callable) -> Callable:
     Returns:
         Wrapped function with query logging functionality
     """
+    # Resolve the position of 'query' once, at decoration time
+    params = list(inspect.signature(func).parameters)
+    try:
+        _qidx = params.index('query')
+    except ValueError:
+        _qidx = None
+    _logger_info = logger.info
+    _enabled = logger.isEnabledFor
+    function_name = func.__name__
+    
     @functools.wraps(func)
     def wrapper(*args, **kwargs) -> Any:
-        # Extract query from function arguments
-        query = None
-        
-        # Try to get query from kwargs first
-        if 'query' in kwargs:
-            query = kwargs['query']
-        # If not in kwargs, try to find it in args based on function signature
-        elif args:
-            import inspect
-            sig = inspect.signature(func)
-            params = list(sig.parameters.keys())
-            if params and len(args) > 0:
-                try:
-                    query_index = params.index('query')
-                    if len(args) > query_index:
-                        query = args[query_index]
-                except (ValueError, IndexError):
-                    query = f"Query not found in standard position. Args: {args}"
+        # Nothing below would be emitted, so just call through
+        if not _enabled(logging.INFO) and not _enabled(logging.ERROR):
+            return func(*args, **kwargs)
         
-        # Log the query with metadata
-        timestamp = datetime.now().isoformat()
-        function_name = func.__name__
+        # Extract query from kwargs first, then from its positional slot
+        query = kwargs.get('query') or (
+            args[_qidx] if _qidx is not None and len(args) > _qidx else None
+        )
         
-        if query:
-            clean_query = ' '.join(query.split()) if isinstance(query, str) else str(query)
-            logger.info(f"[{timestamp}] Executing SQL in {function_name}: {clean_query}")
-        else:
-            logger.warning(f"[{timestamp}] {function_name} called but no query parameter found")
+        if not query:
+            logger.warning(_dumps({
+                'ts': time.time_ns(), 'event': 'missing_query', 'func': function_name,
+            }))
+        # Only normalize the query when INFO records are actually emitted
+        elif _enabled(logging.INFO):
+            clean_query = _normalize(query) if isinstance(query, str) else str(query)
+            _logger_info(_dumps({
+                'ts': time.time_ns(), 'event': 'execute',
+                'func': function_name, 'sql': clean_query,
+            }))
         
         try:
             result = func(*args, **kwargs)
-            logger.info(f"[{timestamp}] Query in {function_name} completed successfully")
+            if _enabled(logging.INFO):
+                _logger_info(_dumps({
+                    'ts': time.time_ns(), 'event': 'completed', 'func': function_name,
+                }))
             return result
             
-        except sqlite3.Error as e:
-            logger.error(f"[{timestamp}] Database error in {function_name}: {e}")
-            logger.error(f"[{timestamp}] Failed query: {query}")
-            raise
-            
         except Exception as e:
-            logger.error(f"[{timestamp}] Unexpected error in {function_name}: {e}")
-            logger.error(f"[{timestamp}] Failed query: {query}")
+            _log_error(function_name, e, query)
             raise
     
     return wrapper
 
+def _connect() -> sqlite3.Connection:
+    """Open a per-call connection with a large prepared-statement cache."""
+    return sqlite3.connect('users.db', cached_statements=512)
+
+def _stream_rows(
+    cursor: sqlite3.Cursor, conn: sqlite3.Connection, function_name: str, query: str
+) -> Iterator[tuple]:
+    """Yield rows from cursor, logging mid-stream errors and closing conn once done."""
+    try:
+        yield from cursor
+    except Exception as e:
+        _log_error(function_name, e, query)
+        raise
+    finally:
+        conn.close()
+
 # Example usage with the provided function
 @log_queries
-def fetch_all_users(query: str) -> list:
+def fetch_all_users(query: str) -> Iterator[tuple]:
     """
     Fetch all users from the database using the provided query.
     
+    The query is executed immediately so errors surface at call time;
+    rows are streamed and the connection closes once they are consumed.
+    log_queries reports 'completed' once the query has executed, before
+    any row is read; errors while streaming are logged as 'error' records.
+    
     Args:
         query: SQL query string to execute
         
     Returns:
-        List of tuples containing query results
+        Iterator of tuples containing query results
     """
-    conn = sqlite3.connect('users.db')
-    cursor = conn.cursor()
-    cursor.execute(query)
-    results = cursor.fetchall()
-    conn.close()
-    return results
+    conn = _connect()
+    try:
+        cursor = conn.execute(query)
+    except BaseException:
+        conn.close()
+        raise
+    return _stream_rows(cursor, conn, 'fetch_all_users', query)
 
 # Additional decorated functions for testing
 @log_queries
 def execute_query(query: str, params: Optional[tuple] = None) -> list:
     """Execute a parameterized query safely."""
-    conn = sqlite3.connect('users.db')
-    cursor = conn.cursor()
-    if params:
-        cursor.execute(query, params)
-    else:
-        cursor.execute(query)
-    results = cursor.fetchall()
-    conn.close()
-    return results
+    conn = _connect()
+    try:
+        return conn.execute(query, params or ()).fetchall()
+    finally:
+        conn.close()
 
 @log_queries
 def update_user(query: str, params: tuple) -> int:
     """Execute an UPDATE query and return affected rows."""
-    conn = sqlite3.connect('users.db')
-    cursor = conn.cursor()
-    cursor.execute(query, params)
-    affected_rows = cursor.rowcount
-    conn.commit()
-    conn.close()
-    return affected_rows
+    conn = _connect()
+    try:
+        affected_rows = conn.execute(query, params).rowcount
+        conn.commit()
+        return affected_rows
+    finally:
+        conn.close()
+
+@log_queries
+def update_users_bulk(query: str, params_seq: Iterable[tuple]) -> int:
+    """
+    Execute an UPDATE query once per parameter tuple in a single transaction.
+    
+    All rows are written with executemany and committed together, so a
+    batch costs one commit instead of one per row. update_user remains
+    available for single-row updates.
+    
+    Args:
+        query: Parameterized UPDATE statement
+        params_seq: Parameter tuples, one per row to update
+        
+    Returns:
+        Total number of affected rows
+    """
+    conn = _connect()
+    try:
+        with conn:
+            return conn.executemany(query, params_seq).rowcount
+    finally:
+        conn.close()
 
 # Test setup and demonstration
 def setup_test_database():
-    """Create a test database with sample data."""
-    conn = sqlite3.connect('users.db')
-    cursor = conn.cursor()
-    
-    # Create users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            age INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+    """Create a test database with sample data in a single transaction."""
+    # Autocommit mode: the script below manages its own BEGIN/COMMIT
+    conn = sqlite3.connect('users.db', isolation_level=None)
     
     # Insert sample data
     sample_users = [
@@ -141,11 +202,29 @@ def setup_test_database():
         ('David Wilson', 'david@example.com', 41)
     ]
     
-    cursor.execute('DELETE FROM users')  # Clear existing data
-    cursor.executemany('INSERT INTO users (name, email, age) VALUES (?, ?, ?)', sample_users)
-    
-    conn.commit()
-    conn.close()
+    try:
+        # The test database is throwaway, so skip fsyncs entirely. The pragma
+        # must run before BEGIN; executescript would otherwise commit early.
+        conn.executescript('''
+            PRAGMA synchronous=OFF;
+            BEGIN;
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                age INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            DELETE FROM users;
+        ''')
+        conn.executemany('INSERT INTO users (name, email, age) VALUES (?, ?, ?)', sample_users)
+        conn.execute('COMMIT')
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
     print("Test database setup complete!")
 
 def run_tests():
@@ -159,7 +238,7 @@ def run_tests():
     
     print("\\n1. Testing successful query:")
     try:
-        users = fetch_all_users(query="SELECT * FROM users")
+        users = list(fetch_all_users(query="SELECT * FROM users"))
         print(f"Retrieved {len(users)} users")
         for user in users[:2]:
             print(f"  - ID: {user[0]}, Name: {user[1]}, Email: {user[2]}")
@@ -188,21 +267,31 @@ def run_tests():
     except Exception as e:
         print(f"Error: {e}")
     
-    print("\\n4. Testing malformed SQL (error handling):")
+    print("\\n4. Testing bulk UPDATE query:")
+    try:
+        affected = update_users_bulk(
+            query="UPDATE users SET age = age + 1 WHERE name = ?",
+            params_seq=[('Bob Smith',), ('Carol Davis',)]
+        )
+        print(f"Updated {affected} rows in one transaction")
+    except Exception as e:
+        print(f"Error: {e}")
+    
+    print("\\n5. Testing malformed SQL (error handling):")
     try:
         bad_result = fetch_all_users(query="INVALID SQL QUERY")
         print("This shouldn't execute")
     except Exception as e:
         print(f"Expected error caught: {type(e).__name__}: {e}")
     
-    print("\\n5. Testing non-existent table:")
+    print("\\n6. Testing non-existent table:")
     try:
         bad_result = fetch_all_users(query="SELECT * FROM non_existent_table")
         print("This shouldn't execute")
     except Exception as e:
         print(f"Expected error caught: {type(e).__name__}: {e}")
     
-    print("\\n6. Testing database connection failure:")
+    print("\\n7. Testing database connection failure:")
     print("(Simulate manually by corrupting or locking the DB file if needed)")
 
 if __name__ == "__main__":
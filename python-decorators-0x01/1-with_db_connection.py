@@ -1,29 +1,10 @@
 import sqlite3
-import functools
-from typing import Callable, Any
+from typing import Optional
 
-def with_db_connection(func: Callable) -> Callable:
-    """
-    Decorator that opens a SQLite database connection and passes it to the function.
-    Automatically closes the connection after execution.
-    
-    Args:
-        func: The function to decorate. Must accept `conn` as first argument.
-    
-    Returns:
-        A wrapped function with connection handling.
-    """
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs) -> Any:
-        conn = sqlite3.connect('users.db')
-        try:
-            return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
-    return wrapper
+from db_utils import with_db_connection
 
 @with_db_connection
-def get_user_by_id(conn: sqlite3.Connection, user_id: int) -> tuple:
+def get_user_by_id(conn: sqlite3.Connection, user_id: int) -> Optional[sqlite3.Row]:
     """
     Fetch a user by ID from the database.
     
@@ -32,9 +13,9 @@ def get_user_by_id(conn: sqlite3.Connection, user_id: int) -> tuple:
         user_id: ID of the user to fetch
     
     Returns:
-        Tuple with user data
+        Row with user data, indexable by position or column name
     """
-    cursor = conn.cursor()
+    cursor = conn.shared_cursor()
     cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
     return cursor.fetchone()
 
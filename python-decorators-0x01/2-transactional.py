@@ -2,24 +2,12 @@ import sqlite3
 import functools
 from typing import Callable, Any
 
-def with_db_connection(func: Callable) -> Callable:
-    """
-    Decorator that manages opening and closing the database connection.
-    Passes the connection to the wrapped function.
-    """
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs) -> Any:
-        conn = sqlite3.connect('users.db')
-        try:
-            return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
-    return wrapper
+from db_utils import invalidates_cache, with_db_connection
 
 def transactional(func: Callable) -> Callable:
     """
     Decorator that wraps a function inside a transaction block.
-    Commits on success, rolls back on failure.
+    Commits on success, rolls back on failure and re-raises the error.
     
     Args:
         func: The function to decorate. Must receive `conn` as first argument.
@@ -29,17 +17,15 @@ def transactional(func: Callable) -> Callable:
     """
     @functools.wraps(func)
     def wrapper(conn: sqlite3.Connection, *args, **kwargs) -> Any:
-        try:
-            result = func(conn, *args, **kwargs)
-            conn.commit()
-            return result
-        except Exception as e:
-            conn.rollback()
-            print(f"Transaction failed: {e}")
-            raise
+        # The connection's context manager commits or rolls back for us
+        with conn:
+            return func(conn, *args, **kwargs)
     return wrapper
 
+UPDATE_EMAIL_SQL = "UPDATE users SET email = ? WHERE id = ?"
+
 @with_db_connection
+@invalidates_cache(UPDATE_EMAIL_SQL)
 @transactional
 def update_user_email(conn: sqlite3.Connection, user_id: int, new_email: str) -> None:
     """
@@ -50,8 +36,7 @@ def update_user_email(conn: sqlite3.Connection, user_id: int, new_email: str) ->
         user_id: ID of the user to update
         new_email: New email address to set
     """
-    cursor = conn.cursor()
-    cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
+    conn.execute(UPDATE_EMAIL_SQL, (new_email, user_id))
 
 # Example test
 if __name__ == "__main__":
@@ -1,29 +1,24 @@
 import sqlite3
 import functools
+import logging
+import random
 import time
-from typing import Callable, Any
+from typing import Callable, Any, Iterator
 
-def with_db_connection(func: Callable) -> Callable:
-    """
-    Decorator that opens and closes a SQLite connection.
-    Passes the connection to the wrapped function.
-    """
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs) -> Any:
-        conn = sqlite3.connect('users.db')
-        try:
-            return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
-    return wrapper
+from db_utils import with_streaming_db_connection
+
+logger = logging.getLogger('db_retry')
 
-def retry_on_failure(retries: int = 3, delay: int = 1) -> Callable:
+def retry_on_failure(retries: int = 3, delay: float = 1) -> Callable:
     """
-    Decorator that retries a function if it raises an exception.
+    Decorator that retries a function if the database is locked.
+    
+    Waits grow exponentially with random jitter between attempts. Any
+    other error is raised immediately without retrying.
     
     Args:
         retries: Number of times to retry before giving up
-        delay: Seconds to wait between retries
+        delay: Base delay in seconds, doubled after every attempt
     
     Returns:
         A wrapped function with retry logic
@@ -34,37 +29,54 @@ def retry_on_failure(retries: int = 3, delay: int = 1) -> Callable:
             for attempt in range(1, retries + 1):
                 try:
                     return func(*args, **kwargs)
-                except Exception as e:
-                    print(f"[Attempt {attempt}] Error: {e}")
+                except sqlite3.OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                    logger.warning("[Attempt %d] Error: %s", attempt, e)
                     if attempt < retries:
-                        print(f"Retrying in {delay} seconds...")
-                        time.sleep(delay)
+                        pause = delay * (2 ** (attempt - 1)) + random.uniform(0, delay)
+                        logger.warning("Retrying in %.2f seconds...", pause)
+                        time.sleep(pause)
                     else:
-                        print("All retry attempts failed.")
+                        logger.error("All retry attempts failed.")
                         raise
         return wrapper
     return decorator
 
-@with_db_connection
 @retry_on_failure(retries=3, delay=1)
-def fetch_users_with_retry(conn: sqlite3.Connection) -> list:
+def _select_users(conn: sqlite3.Connection) -> sqlite3.Cursor:
+    """Run the users query, retrying while the database is locked."""
+    cursor = conn.shared_cursor()
+    cursor.execute("SELECT * FROM users")
+    return cursor
+
+@with_streaming_db_connection
+def fetch_users_with_retry(conn: sqlite3.Connection) -> Iterator[sqlite3.Row]:
     """
     Fetch all users from the database. Retries if failure occurs.
     
+    Rows are streamed from the cursor instead of being materialized into
+    a list; the query runs (and is retried) when iteration starts.
+    
     Args:
         conn: SQLite connection object
     
     Returns:
-        List of user records
+        Iterator yielding user records
     """
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users")
-    return cursor.fetchall()
+    # Plain iteration rather than yield from: closing this generator early
+    # must not close the connection's shared cursor
+    for row in _select_users(conn):
+        yield row
 
 # Example usage
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
     try:
-        users = fetch_users_with_retry()
-        print(f"Fetched {len(users)} users.")
+        count = sum(1 for _ in fetch_users_with_retry())
+        print(f"Fetched {count} users.")
     except Exception as e:
         print(f"Final failure: {e}")
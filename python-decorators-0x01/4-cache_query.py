@@ -1,48 +1,111 @@
 import sqlite3
 import functools
-from typing import Callable, Any, Dict
+import hashlib
+import inspect
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Any, Iterator
 
-# Simple in-memory cache dictionary
-query_cache: Dict[str, Any] = {}
+from db_utils import bump_table_version, table_version, with_db_connection
 
-def with_db_connection(func: Callable) -> Callable:
-    """
-    Decorator that opens and closes a SQLite database connection.
-    Passes the connection to the wrapped function.
-    """
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs) -> Any:
-        conn = sqlite3.connect('users.db')
-        try:
-            return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
-    return wrapper
+logger = logging.getLogger('db_cache')
+
+# Bounded LRU cache of query results, keyed by normalized SQL, params and
+# the table's write version, so entries from before a write are never hit
+QUERY_CACHE_MAX = 1024
+query_cache: "OrderedDict[bytes, Any]" = OrderedDict()
+# Guards every read-and-reorder and insert-and-evict on query_cache
+_cache_lock = threading.Lock()
+_MISSING = object()
+
+# Statements that modify data are never cached; they invalidate instead
+_MUTATION_RE = re.compile(r'\s*(UPDATE|INSERT|DELETE)\b', re.IGNORECASE)
+
+# Quoted SQL literals and identifiers, kept verbatim during normalization
+_QUOTED_RE = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def _normalize(query: str) -> str:
+    """Collapse whitespace in a SQL string, leaving quoted text untouched."""
+    parts = _QUOTED_RE.split(query)
+    # split() with a capture group puts the quoted pieces at odd indexes
+    parts[::2] = [_WHITESPACE_RE.sub(' ', part) for part in parts[::2]]
+    return ''.join(parts).strip()
+
+def _cache_key(query: str, params: Any, version: int) -> bytes:
+    """Hash the whitespace-normalized query with its params and table version."""
+    normalized = _normalize(query) + repr(params) + '#' + str(version)
+    return hashlib.blake2b(normalized.encode(), digest_size=16).digest()
 
 def cache_query(func: Callable) -> Callable:
     """
-    Decorator that caches the results of SQL queries using a string key.
+    Decorator that caches the results of SQL queries in a bounded LRU cache.
+    
+    The cache key covers the normalized query text and its `params`, so the
+    same SQL with different bind values is cached separately. It also
+    includes the queried table's write version: queries that modify data
+    (UPDATE, INSERT, DELETE) always run, are committed, are never cached,
+    and then bump that version so earlier results for the table become
+    unreachable.
     
     Args:
         func: A function that executes a SQL query. Must accept `query` as arg.
     
     Returns:
-        A wrapped function that uses cache if the query string has been seen.
+        A wrapped function that uses cache if the query has been seen.
     """
+    # Resolve the slots of 'query' and 'params' in *args (after conn) once,
+    # at decoration time
+    params = list(inspect.signature(func).parameters)
+    try:
+        _qidx = params.index("query") - 1
+    except ValueError:
+        _qidx = None
+    try:
+        _pidx = params.index("params") - 1
+    except ValueError:
+        _pidx = None
+
     @functools.wraps(func)
     def wrapper(conn: sqlite3.Connection, *args, **kwargs) -> Any:
-        # Attempt to get the query string from either args or kwargs
-        query = kwargs.get("query") or (args[0] if args else None)
+        # Attempt to get the query string from either kwargs or its positional slot
+        query = kwargs.get("query") or (
+            args[_qidx] if _qidx is not None and len(args) > _qidx else None
+        )
         if not query:
             raise ValueError("Missing SQL query for caching")
 
-        if query in query_cache:
-            print("[CACHE HIT] Returning cached result.")
-            return query_cache[query]
+        if _MUTATION_RE.match(query):
+            # Commit before bumping, so no reader can cache pre-write data
+            # under the new version
+            with conn:
+                result = func(conn, *args, **kwargs)
+            bump_table_version(query)
+            return result
 
-        print("[CACHE MISS] Executing and caching result.")
+        bind = kwargs.get("params") if "params" in kwargs else (
+            args[_pidx] if _pidx is not None and len(args) > _pidx else None
+        )
+        # Read the version before executing so a concurrent write wins
+        key = _cache_key(query, bind, table_version(query))
+        with _cache_lock:
+            cached = query_cache.get(key, _MISSING)
+            if cached is not _MISSING:
+                query_cache.move_to_end(key)
+        if cached is not _MISSING:
+            logger.debug("Cache hit: %s", query)
+            return cached
+
+        # The query itself runs unlocked; only the cache update is guarded
+        logger.debug("Cache miss, executing and caching: %s", query)
         result = func(conn, *args, **kwargs)
-        query_cache[query] = result
+        with _cache_lock:
+            query_cache[key] = result
+            query_cache.move_to_end(key)
+            while len(query_cache) > QUERY_CACHE_MAX:
+                query_cache.popitem(last=False)
         return result
     return wrapper
 
@@ -59,12 +122,29 @@ def fetch_users_with_cache(conn: sqlite3.Connection, query: str) -> list:
     Returns:
         Query result list
     """
-    cursor = conn.cursor()
-    cursor.execute(query)
-    return cursor.fetchall()
+    return conn.execute(query).fetchall()
+
+def fetch_users_with_cache_iter(query: str) -> Iterator[sqlite3.Row]:
+    """
+    Streaming variant of fetch_users_with_cache.
+    
+    Results are still materialized once for caching; this yields rows
+    from the cached list so callers can iterate without holding a copy.
+    
+    Args:
+        query: SQL SELECT query
+    
+    Returns:
+        Iterator over the query results
+    """
+    yield from fetch_users_with_cache(query=query)
 
 # Test calls
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
     query = "SELECT * FROM users"
 
     print("First call (expected cache miss):")
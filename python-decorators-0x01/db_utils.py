@@ -0,0 +1,171 @@
+"""
+Shared SQLite connection handling for the decorator scripts.
+
+Connections to users.db are pre-opened into a bounded pool and handed
+out by the with_db_connection decorator, or by
+with_streaming_db_connection for generators. Per-table write versions let
+query caches drop results that a later write has made stale.
+"""
+import sqlite3
+import functools
+import atexit
+import itertools
+import os
+import queue
+import re
+from typing import Callable, Any, Dict, Iterator, Optional
+
+class _SharedCursor(sqlite3.Cursor):
+    """Cursor that remembers being closed, so its owner can replace it."""
+    closed = False
+
+    def close(self) -> None:
+        self.closed = True
+        super().close()
+
+class _PooledConnection(sqlite3.Connection):
+    """Connection that lazily creates one cursor and reuses it across calls."""
+    _cur: Optional[_SharedCursor] = None
+
+    def shared_cursor(self) -> sqlite3.Cursor:
+        """Return this connection's reusable cursor, replacing it if closed."""
+        if self._cur is None or self._cur.closed:
+            self._cur = self.cursor(_SharedCursor)
+        return self._cur
+
+def _connect() -> sqlite3.Connection:
+    """Open a WAL-mode connection that can be handed between threads."""
+    conn = sqlite3.connect(
+        'users.db', check_same_thread=False, cached_statements=512,
+        factory=_PooledConnection,
+    )
+    conn.executescript("""
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-64000;
+        PRAGMA mmap_size=268435456;
+    """)
+    # Rows still index by position, and also by column name
+    conn.row_factory = sqlite3.Row
+    return conn
+
+# Pool of pre-opened connections shared by every decorated call
+_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', os.cpu_count() or 1))
+_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+if _POOL_SIZE < 1:
+    # Queue(maxsize=0) is unbounded and would start empty, so every call
+    # would just wait out the timeout
+    raise ValueError(f"DB_POOL_SIZE must be at least 1, got {_POOL_SIZE}")
+_POOL: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=_POOL_SIZE)
+for _ in range(_POOL_SIZE):
+    _POOL.put(_connect())
+
+def _close_pool() -> None:
+    """Close every connection currently held by the pool."""
+    while not _POOL.empty():
+        _POOL.get_nowait().close()
+
+atexit.register(_close_pool)
+
+def _checkout() -> sqlite3.Connection:
+    """Borrow a connection, failing instead of blocking forever if none free up."""
+    try:
+        return _POOL.get(timeout=_POOL_TIMEOUT)
+    except queue.Empty:
+        raise sqlite3.OperationalError(
+            f"no pooled connection available after {_POOL_TIMEOUT} seconds"
+        ) from None
+
+def _release(conn: sqlite3.Connection) -> None:
+    """Return a connection to the pool, discarding any uncommitted transaction."""
+    if conn.in_transaction:
+        conn.rollback()
+    _POOL.put(conn)
+
+def with_db_connection(func: Callable) -> Callable:
+    """
+    Decorator that borrows a SQLite connection from the pool.
+    Passes the connection to the wrapped function and returns it to the
+    pool once the function returns.
+    """
+    _get_conn = _checkout
+    _put_conn = _release
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs) -> Any:
+        conn = _get_conn()
+        try:
+            return func(conn, *args, **kwargs)
+        finally:
+            _put_conn(conn)
+    return wrapper
+
+def with_streaming_db_connection(func: Callable) -> Callable:
+    """
+    Decorator for generator functions that stream rows from the database.
+    
+    The connection is borrowed when iteration starts, not at call time, and
+    returned when the generator finishes or is closed, so an iterator that
+    is never consumed never holds a pooled connection.
+    
+    Args:
+        func: Generator function. Must accept `conn` as first argument.
+    
+    Returns:
+        A generator function with connection handling.
+    """
+    _get_conn = _checkout
+    _put_conn = _release
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs) -> Iterator[Any]:
+        conn = _get_conn()
+        try:
+            yield from func(conn, *args, **kwargs)
+        finally:
+            _put_conn(conn)
+    return wrapper
+
+# Version stamp per table, replaced on every write; readers put it in cache keys
+_table_versions: Dict[str, int] = {}
+_write_counter = itertools.count(1)
+_TABLE_RE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+["`\[]?(\w+)', re.IGNORECASE)
+
+def table_of(sql: str) -> Optional[str]:
+    """Return the (lowercased) first table named in a SQL statement."""
+    match = _TABLE_RE.search(sql)
+    return match.group(1).lower() if match else None
+
+def table_version(sql: str) -> int:
+    """Return the current write version of the table that sql reads."""
+    return _table_versions.get(table_of(sql), 0)
+
+def bump_table_version(sql: str) -> None:
+    """Record a write to the table targeted by sql."""
+    table = table_of(sql)
+    if table is not None:
+        # next() on a shared counter is atomic, so concurrent writers never collide
+        _table_versions[table] = next(_write_counter)
+
+def invalidates_cache(sql: str) -> Callable:
+    """
+    Decorator that bumps the table version for sql once func returns.
+    
+    Place it outside transactional so the bump follows the commit and no
+    reader can cache pre-commit data under the new version.
+    
+    Args:
+        sql: The write statement the decorated function executes
+    
+    Returns:
+        A decorator that marks the written table as changed
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) -> Any:
+            result = func(*args, **kwargs)
+            bump_table_version(sql)
+            return result
+        return wrapper
+    return decorator